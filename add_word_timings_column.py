@@ -0,0 +1,40 @@
+"""
+Small one-off migration: add `word_timings` column to the `transcripts` table if it doesn't exist.
+Supports SQLite and Postgres.
+Run from the repository root: python add_word_timings_column.py
+"""
+import os
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def main():
+    database_url = os.getenv("DATABASE_URL", "sqlite:///transcripts.db")
+    print(f"Using DATABASE_URL={database_url}")
+    engine = create_engine(database_url)
+    insp = inspect(engine)
+    if not insp.has_table("transcripts"):
+        print("Table `transcripts` does not exist. Nothing to do.")
+        return
+    cols = [c["name"] for c in insp.get_columns("transcripts")]
+    print("Existing columns:", cols)
+    if "word_timings" in cols:
+        print("Column `word_timings` already exists. Nothing to do.")
+        return
+
+    dialect = engine.dialect.name
+    print("Database dialect:", dialect)
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                conn.execute(text('ALTER TABLE transcripts ADD COLUMN word_timings TEXT'))
+                print("Added column `word_timings` (TEXT) to `transcripts` (sqlite)")
+            else:
+                conn.execute(text('ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS word_timings TEXT'))
+                print("Added column `word_timings` (TEXT) to `transcripts`")
+    except Exception as e:
+        print("Failed to add column:", e)
+
+if __name__ == '__main__':
+    main()
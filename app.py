@@ -2,10 +2,11 @@ from flask import Flask, request, jsonify, Response, send_file
 from flask_cors import CORS
 from pydub import AudioSegment
 import io, time, json
+from functools import lru_cache
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, cast
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, Date, cast
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.exc import DataError
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy import String as SA_String
 from supabase_client import (
     insert_transcript,
@@ -13,6 +14,40 @@ from supabase_client import (
     get_transcripts_for_user,
     get_supabase_client,
     get_user_from_bearer,
+    get_transcript,
+    get_circuit_metrics,
+)
+from audio_meta import probe_duration
+from responses import RESPONSE_MODES, OrjsonProvider, compress_response, orjson, shape_transcript_response
+from language import (
+    DEFAULT_LANGUAGE,
+    LANGUAGE_PROBE_MAX_BYTES,
+    LIVE_LANGUAGE_PROBES,
+    LanguageProbeError,
+    detect_language,
+    listen_url,
+    probe_clip,
+    probe_clip_from_file,
+    probe_clip_from_path,
+    route,
+)
+from timings import encode_word_timings, extract_words, WordTimings
+from uploads import (
+    UploadError,
+    append_chunk,
+    claim_transcription,
+    create_upload,
+    discard_data,
+    holding_claim,
+    iter_received,
+    load_state,
+    open_upload,
+    parse_metadata,
+    streaming_failed,
+    update_state,
+    upload_path,
+    valid_upload_id,
+    wait_for_offset,
 )
 import os
 from dotenv import load_dotenv
@@ -23,6 +58,8 @@ from pydub import AudioSegment
 from deepgram import Deepgram
 import io, os
 import asyncio
+import re
+import threading
 print("hi in progress")
 
 load_dotenv()
@@ -32,12 +69,14 @@ if not DEEPGRAM_API_KEY:
     raise ValueError("DEEPGRAM_API_KEY is not set. Please check your environment variables.")
 
 dg_client = Deepgram(DEEPGRAM_API_KEY)
-DEEPGRAM_URL = "https://api.deepgram.com/v1/listen?model=nova-3&smart_format=true"
 
 
 # -------------------- Flask setup --------------------
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Location", "Upload-Offset", "Upload-Length", "Tus-Resumable"])
+if orjson:
+    app.json = OrjsonProvider(app)
+app.after_request(compress_response)
 
 # -------------------- Load environment --------------------
 load_dotenv()
@@ -59,6 +98,17 @@ class Transcript(Base):
     filename = Column(String, nullable=True)
     user_id = Column(String, nullable=True)
     language = Column(String, default="en")
+    word_timings = Column(Text, nullable=True)
+
+
+class UsageDaily(Base):
+    """Per-user daily usage rollup, updated incrementally as transcripts are saved."""
+    __tablename__ = "usage_daily"
+    user_id = Column(String, primary_key=True)  # "" for requests without a user
+    day = Column(Date, primary_key=True)
+    audio_seconds = Column(Float, nullable=False, default=0.0)
+    transcript_count = Column(Integer, nullable=False, default=0)
+    provider_calls = Column(Integer, nullable=False, default=0)
 
 
 Base.metadata.create_all(bind=engine)
@@ -72,10 +122,135 @@ live_progress = {
     "total_chunks": 0,
     "processed_chunks": 0,
     "filename": None,
+    "language": None,
+    "language_probes": 0,
+    "duration_seconds": 0.0,
 }
 file_progress = {"progress": 0, "text": "", "status": "idle", "transcript_id": None}
 
 
+# -------------------- Helpers --------------------
+def _extract_bearer(req):
+    ah = req.headers.get("Authorization") or ""
+    if ah.lower().startswith("bearer "):
+        return ah.split(None, 1)[1]
+    return None
+
+
+def _record_usage(user_id, audio_seconds=0.0, transcripts=0, provider_calls=0):
+    """Add to today's usage rollup row for `user_id` in place."""
+    key = {"user_id": str(user_id or ""), "day": datetime.utcnow().date()}
+    increments = {
+        UsageDaily.audio_seconds: UsageDaily.audio_seconds + (audio_seconds or 0.0),
+        UsageDaily.transcript_count: UsageDaily.transcript_count + transcripts,
+        UsageDaily.provider_calls: UsageDaily.provider_calls + provider_calls,
+    }
+    session = SessionLocal()
+    try:
+        updated = session.query(UsageDaily).filter_by(**key).update(increments, synchronize_session=False)
+        if not updated:
+            session.add(UsageDaily(
+                **key,
+                audio_seconds=audio_seconds or 0.0,
+                transcript_count=transcripts,
+                provider_calls=provider_calls,
+            ))
+        try:
+            session.commit()
+        except IntegrityError:
+            # another worker created today's row first; add to it instead
+            session.rollback()
+            session.query(UsageDaily).filter_by(**key).update(increments, synchronize_session=False)
+            session.commit()
+    except Exception:
+        session.rollback()
+        print(f"Failed to update usage rollup for user_id={user_id}")
+    finally:
+        session.close()
+
+
+def _detect_language(clip, user_id=None):
+    """Run the language probe on `clip`; each probe Deepgram answers counts as a provider call."""
+    if clip is None:
+        return None
+    try:
+        language = detect_language(clip, DEEPGRAM_API_KEY)
+    except LanguageProbeError as e:
+        print(f"Warning: language probe failed: {e}")
+        return None
+    _record_usage(user_id, provider_calls=1)
+    return language
+
+
+def _save_transcript(text, filename, user_id=None, duration_seconds=None, word_timings=None, language=None,
+                     live_chunk=False):
+    """Persist a transcript to Supabase, falling back to the local DB on failure.
+
+    Every saved transcript comes from one successful provider call, so the
+    usage rollup is updated here as well. The rollup's transcript count is per
+    recording session: an upload counts here, while a live chunk only adds
+    minutes and the whole live session is counted once by /stop-live.
+    """
+    _record_usage(
+        user_id,
+        audio_seconds=duration_seconds,
+        transcripts=0 if live_chunk else 1,
+        provider_calls=1,
+    )
+    _store_transcript(text, filename, user_id, duration_seconds, word_timings, language)
+
+
+def _store_transcript(text, filename, user_id=None, duration_seconds=None, word_timings=None, language=None):
+    """Insert a transcript row into Supabase, or into the local DB when that fails or is unavailable."""
+    record = {
+        'text': text,
+        'filename': filename,
+        'duration_seconds': duration_seconds,
+        'word_timings': word_timings,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    if user_id:
+        record['user_id'] = user_id
+    if language:
+        record['language'] = language
+
+    resp = None
+    try:
+        resp = insert_transcript(record)
+    except Exception:
+        resp = None
+
+    if resp and not (isinstance(resp, dict) and resp.get('error')):
+        return
+
+    # Supabase insert failed or returned an error; write to local DB
+    session = SessionLocal()
+    try:
+        t = Transcript(
+            text=text,
+            filename=filename,
+            duration_seconds=duration_seconds,
+            word_timings=word_timings,
+            language=language or "en",
+            created_at=datetime.utcnow(),
+            user_id=user_id
+        )
+        session.add(t)
+        try:
+            session.commit()
+        except DataError:
+            # user_id likely can't accept string; retry without it
+            session.rollback()
+            t.user_id = None
+            session.add(t)
+            session.commit()
+    except Exception:
+        session.rollback()
+        print(f"Failed fallback local insert for {filename}")
+    finally:
+        session.close()
+
+
 # -------------------- Routes --------------------
 @app.route("/")
 def home():
@@ -98,6 +273,9 @@ def upload_live():
             "total_chunks": 0,
             "processed_chunks": 0,
             "filename": None,
+            "language": None,
+            "language_probes": 0,
+            "duration_seconds": 0.0,
         }
 
     if "audio" not in request.files:
@@ -119,6 +297,28 @@ def upload_live():
         audio_segment.export(wav_io, format="wav")
         wav_io.seek(0)
 
+        token = _extract_bearer(request)
+        user = None
+        try:
+            user = get_user_from_bearer(token) if token else None
+        except Exception:
+            # ensure resolution errors don't crash the main flow
+            print("Warning: user resolution failed during upload_live; continuing without user_id")
+            user = None
+        user_id = user.get('id') if user else None
+
+        # Identify the language once per live session from a short probe of the
+        # first chunk; retried on the next chunk if detection was inconclusive, then
+        # settled on DEFAULT_LANGUAGE so a silent or noisy session stops probing.
+        language = request.form.get("language") or live_progress.get("language")
+        if not language:
+            live_progress["language_probes"] = live_progress.get("language_probes", 0) + 1
+            language = _detect_language(probe_clip(audio_segment), user_id)
+            if not language and live_progress["language_probes"] >= LIVE_LANGUAGE_PROBES:
+                language = DEFAULT_LANGUAGE
+        live_progress["language"] = language
+        deepgram_options = route(language)
+
         # 🔥 Deepgram transcription
         response = asyncio.run(
             dg_client.transcription.prerecorded(
@@ -128,13 +328,16 @@ def upload_live():
                 },
                 {
                     "punctuate": True,
-                    "language": "en",
-                    "model": "general",
+                    "language": deepgram_options["language"],
+                    "model": deepgram_options["model"],
                 }
             )
         )
 
         text_chunk = response["results"]["channels"][0]["alternatives"][0]["transcript"]
+        word_timings = encode_word_timings(text_chunk, extract_words(response))
+        # duration from the decoded frames we already have in memory
+        duration_seconds = len(audio_segment) / 1000.0
 
         # Simulate DB record creation
         if not live_progress["transcript_id"]:
@@ -146,6 +349,7 @@ def upload_live():
 
         live_progress["total_chunks"] += 1
         live_progress["processed_chunks"] += 1
+        live_progress["duration_seconds"] = live_progress.get("duration_seconds", 0.0) + duration_seconds
         progress_percent = int(
             (live_progress["processed_chunks"] / live_progress["total_chunks"]) * 100
         )
@@ -154,69 +358,18 @@ def upload_live():
 
         # Attempt to persist transcript to Supabase with user info if provided
         try:
-            def _extract_bearer(req):
-                ah = req.headers.get("Authorization") or ""
-                if ah.lower().startswith("bearer "):
-                    return ah.split(None, 1)[1]
-                return None
-
-            token = _extract_bearer(request)
-            user = None
-            try:
-                user = get_user_from_bearer(token) if token else None
-            except Exception:
-                # ensure resolution errors don't crash the main flow
-                print("Warning: user resolution failed during upload_live; continuing without user_id")
-                user = None
-
-            if user:
-                print(f"upload_live: resolved user id={user.get('id')}")
-
-            # Build record without assuming user exists
-            record = {
-                'text': text_chunk,
-                'filename': wav_filename,
-                'duration_seconds': None,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            if user and user.get('id'):
-                record['user_id'] = user.get('id')
-
-            # Try to insert to Supabase; if that returns an error or is unavailable,
-            # persist to local DB as a fallback so the entry is visible in history.
-            resp = None
-            try:
-                resp = insert_transcript(record)
-            except Exception:
-                resp = None
-
-            if not resp or (isinstance(resp, dict) and resp.get('error')):
-                session = SessionLocal()
-                try:
-                    t = Transcript(
-                        text=text_chunk,
-                        filename=wav_filename,
-                        duration_seconds=None,
-                        created_at=datetime.utcnow(),
-                        user_id=(user.get('id') if user else None)
-                    )
-                    session.add(t)
-                    try:
-                        session.commit()
-                    except DataError:
-                        # likely type mismatch (user_id column is integer). Retry without user_id.
-                        session.rollback()
-                        t.user_id = None
-                        try:
-                            session.add(t)
-                            session.commit()
-                        except Exception:
-                            session.rollback()
-                            print("Failed fallback local insert for live upload even after removing user_id")
-                except Exception:
-                    print("Failed fallback local insert for live upload")
-                finally:
-                    session.close()
+            if user_id:
+                print(f"upload_live: resolved user id={user_id}")
+
+            _save_transcript(
+                text_chunk,
+                wav_filename,
+                user_id=user_id,
+                duration_seconds=duration_seconds,
+                word_timings=word_timings,
+                language=deepgram_options["language"],
+                live_chunk=True,
+            )
         except Exception:
             # ignore persistence errors here; they'll be handled by stop-live fallback
             pass
@@ -237,55 +390,33 @@ def upload_live():
 @app.route("/stop-live", methods=["POST"])
 def stop_live():
     global live_progress
+    already_stopped = live_progress.get("status") == "completed"
     live_progress["status"] = "completed"
     live_progress["progress"] = 100
 
-    # Save final text to DB
-    # Try to save to Supabase first if available
+    token = _extract_bearer(request)
     try:
-        supabase = get_supabase_client()
-        if supabase:
-            insert_transcript({
-                'text': live_progress["text"],
-                'filename': live_progress.get('filename'),
-                'duration_seconds': None,
-                'created_at': datetime.utcnow().isoformat()
-            })
+        user = get_user_from_bearer(token) if token else None
     except Exception:
-        # Fallback to local DB (try to include user_id if provided via Authorization)
-        try:
-            auth_header = request.headers.get("Authorization") or ""
-            token = None
-            if auth_header.lower().startswith("bearer "):
-                token = auth_header.split(None, 1)[1]
-            user = get_user_from_bearer(token) if token else None
-            user_id = user.get('id') if user else None
-
-            session = SessionLocal()
-            # If there is a transcript row from the same live session, update it
-            transcript_id = live_progress.get("transcript_id")
-            if transcript_id:
-                transcript = session.query(Transcript).filter(Transcript.id == transcript_id).first()
-                if transcript:
-                    transcript.text = live_progress["text"]
-                    if user_id:
-                        transcript.user_id = user_id
-                    session.commit()
-            else:
-                # Insert a new transcript record locally
-                t = Transcript(
-                    text=live_progress["text"],
-                    filename=live_progress.get('filename'),
-                    duration_seconds=None,
-                    created_at=datetime.utcnow(),
-                    user_id=user_id
-                )
-                session.add(t)
-                session.commit()
-            session.close()
-        except Exception:
-            # best-effort fallback; ignore failures here
-            pass
+        print("Warning: user resolution failed during stop_live; continuing without user_id")
+        user = None
+    user_id = user.get('id') if user else None
+
+    # The live session is one transcript in the usage rollup; its chunks already
+    # added their minutes and provider calls. Count it once, even if stop is repeated.
+    if not already_stopped and live_progress.get("processed_chunks"):
+        _record_usage(user_id, transcripts=1)
+
+    # Save the session's final text; _store_transcript falls back to the local DB
+    # when Supabase is unconfigured, failing or short-circuited by the breaker.
+    if not already_stopped:
+        _store_transcript(
+            live_progress.get("text", ""),
+            live_progress.get('filename'),
+            user_id=user_id,
+            duration_seconds=live_progress.get("duration_seconds") or None,
+            language=route(live_progress.get('language'))["language"],
+        )
 
     return jsonify({
         "status": "recording stopped",
@@ -313,6 +444,8 @@ def upload_file():
     """
     API endpoint: /transcribe
     Accepts an audio file and returns transcribed text using Deepgram.
+    Optional `response` param (minimal | timings | full, default full) picks the payload shape.
+    Optional `language` param skips language detection.
     """
     if "file" not in request.files:
         return jsonify({"error": "No file part in request."}), 400
@@ -321,6 +454,11 @@ def upload_file():
     if file.filename == "":
         return jsonify({"error": "No selected file."}), 400
 
+    # minimal: transcript only, timings: + compact word arrays, full: + raw Deepgram response
+    mode = (request.args.get("response") or request.form.get("response") or "full").lower()
+    if mode not in RESPONSE_MODES:
+        return jsonify({"error": f"response must be one of {', '.join(RESPONSE_MODES)}"}), 400
+
     try:
         # Send file to Deepgram API
         headers = {
@@ -329,12 +467,6 @@ def upload_file():
         }
 
         # Attempt to extract user from Authorization header and attach to record
-        def _extract_bearer(req):
-            ah = req.headers.get("Authorization") or ""
-            if ah.lower().startswith("bearer "):
-                return ah.split(None, 1)[1]
-            return None
-
         token = _extract_bearer(request)
         user_id = None
         try:
@@ -346,78 +478,213 @@ def upload_file():
             print("Warning: user resolution failed during upload_file; continuing without user_id")
             user_id = None
 
-        response = requests.post(DEEPGRAM_URL, headers=headers, data=file)
+        probed_duration = probe_duration(file.stream)
+
+        # Route to the right model from a short language probe unless the client passes a language
+        language = request.args.get("language") or request.form.get("language")
+        if not language:
+            clip = probe_clip_from_file(file.stream)
+            language = _detect_language(clip, user_id)
+        deepgram_options = route(language)
+
+        response = requests.post(listen_url(deepgram_options), headers=headers, data=file)
         response.raise_for_status()
 
         result = response.json()
         transcript = result.get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0].get("transcript", "")
+        word_timings = encode_word_timings(transcript, extract_words(result))
+        duration_seconds = probed_duration or result.get("metadata", {}).get("duration")
+
+        _save_transcript(
+            transcript,
+            file.filename,
+            user_id=user_id,
+            duration_seconds=duration_seconds,
+            word_timings=word_timings,
+            language=deepgram_options["language"],
+        )
 
-        # Persist transcript with user if available
-        try:
-            record = {
-                'text': transcript,
-                'filename': file.filename,
-                'duration_seconds': None,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            if user_id:
-                record['user_id'] = user_id
+        return jsonify(shape_transcript_response(
+            mode, transcript, result, word_timings, duration_seconds, deepgram_options["language"]
+        ))
 
-            resp = None
-            try:
-                resp = insert_transcript(record)
-            except Exception:
-                resp = None
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": str(e)}), 500
+
+# -------------------- Resumable uploads (tus-style) --------------------
+TUS_VERSION = "1.0.0"
+# (connect, read) seconds for the Deepgram request of a resumable upload; a hung
+# request would otherwise hold the upload's transcription claim indefinitely
+RESUMABLE_DEEPGRAM_TIMEOUT = (10, float(os.getenv("RESUMABLE_DEEPGRAM_TIMEOUT", "900")))
+
+
+def _tus_headers(state):
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(state["offset"]),
+        "Upload-Length": str(state["length"]),
+        "Cache-Control": "no-store",
+    }
 
-            # If Supabase insert failed or returned an error, write to local DB
-            if not resp or (isinstance(resp, dict) and resp.get('error')):
-                session = SessionLocal()
+
+def _transcribe_resumable(upload_id, streaming=False):
+    """Send a resumable upload to Deepgram and persist the transcript.
+
+    Callers must have claimed the upload with claim_transcription() first; the
+    claim is kept fresh while this runs so it is only taken over if the worker dies.
+    With `streaming`, the language is probed as soon as the first few seconds
+    are on disk, then the request body is fed from disk as chunks arrive, so
+    transcription overlaps with the rest of the upload. If that fails after the
+    last chunk has landed, it is retried once from the complete file.
+    """
+    state = load_state(upload_id)
+    headers = {
+        "Authorization": f"Token {DEEPGRAM_API_KEY}",
+        "Content-Type": state.get("content_type") or "audio/wav"
+    }
+    with holding_claim(upload_id):
+        try:
+            probed_duration = None
+            language = state.get("language")
+            probed = False
+            result = None
+            if streaming:
                 try:
-                    t = Transcript(
-                        text=transcript,
-                        filename=file.filename,
-                        duration_seconds=None,
-                        created_at=datetime.utcnow(),
-                        user_id=user_id
-                    )
-                    session.add(t)
-                    try:
-                        session.commit()
-                    except DataError:
-                        # user_id likely can't accept string; retry without it
-                        session.rollback()
-                        t.user_id = None
-                        try:
-                            session.add(t)
-                            session.commit()
-                        except Exception:
-                            session.rollback()
-                            print("Failed fallback local insert for file upload after removing user_id")
-                finally:
-                    session.close()
-        except Exception:
-            # If any unexpected error happens, try to persist locally as a last resort
-            try:
-                session = SessionLocal()
-                t = Transcript(
-                    text=transcript,
-                    filename=file.filename,
-                    duration_seconds=None,
-                    created_at=datetime.utcnow(),
-                    user_id=user_id
-                )
-                session.add(t)
-                session.commit()
-            except Exception:
-                print("Unexpected failure persisting transcript")
+                    if not language:
+                        # wait for the first few seconds to land, probe them, then stream
+                        if not wait_for_offset(upload_id, min(state["length"], LANGUAGE_PROBE_MAX_BYTES)):
+                            raise UploadError("Upload stalled before the language probe", 408)
+                        with open_upload(upload_id) as f:
+                            clip = probe_clip_from_file(f)
+                        language = _detect_language(clip, state.get("user_id"))
+                        probed = True
+                    deepgram_options = route(language)
+                    response = requests.post(listen_url(deepgram_options), headers=headers, data=iter_received(upload_id),
+                                             timeout=RESUMABLE_DEEPGRAM_TIMEOUT)
+                    response.raise_for_status()
+                    result = response.json()
+                except Exception as e:
+                    if not streaming_failed(upload_id, str(e)):
+                        print(f"Resumable upload {upload_id} streaming transcription failed: {e}")
+                        return
+                    print(f"Resumable upload {upload_id} streaming transcription failed; retrying from file: {e}")
+
+            if result is None:
+                with open_upload(upload_id) as f:
+                    probed_duration = probe_duration(f)
+                    if not language and not probed:
+                        # let ffmpeg read the .part file directly and stop after the probe window
+                        clip = probe_clip_from_path(upload_path(upload_id))
+                        language = _detect_language(clip, state.get("user_id"))
+                    deepgram_options = route(language)
+                    response = requests.post(listen_url(deepgram_options), headers=headers, data=f,
+                                             timeout=RESUMABLE_DEEPGRAM_TIMEOUT)
+                response.raise_for_status()
+                result = response.json()
+
+            transcript = result.get("results", {}).get("channels", [{}])[0].get("alternatives", [{}])[0].get("transcript", "")
+            duration_seconds = probed_duration or result.get("metadata", {}).get("duration")
+            _save_transcript(
+                transcript,
+                state.get("filename"),
+                user_id=state.get("user_id"),
+                duration_seconds=duration_seconds,
+                word_timings=encode_word_timings(transcript, extract_words(result)),
+                language=deepgram_options["language"],
+            )
+            update_state(upload_id, status="completed", transcript=transcript)
+            discard_data(upload_id)
+        except Exception as e:
+            print(f"Resumable upload {upload_id} transcription failed: {e}")
+            update_state(upload_id, status="failed", error=str(e))
 
-        return jsonify({
-            "transcript": transcript,
-            "deepgram_response": result  # Optional: include full response for debugging
-        })
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": str(e)}), 500
+@app.route("/uploads", methods=["POST"])
+def create_resumable_upload():
+    """Start a resumable upload.
+
+    Headers: Upload-Length (total bytes) and optional Upload-Metadata with
+    base64 `filename`, `filetype`, `language` (skips language detection) and
+    `stream` ("true" to start transcribing while chunks are still arriving).
+    """
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Length header is required"}), 400
+
+    try:
+        meta = parse_metadata(request.headers.get("Upload-Metadata"))
+        user_id = None
+        token = _extract_bearer(request)
+        try:
+            user = get_user_from_bearer(token) if token else None
+            if user and user.get('id'):
+                user_id = user.get('id')
+        except Exception:
+            print("Warning: user resolution failed during create upload; continuing without user_id")
+
+        state = create_upload(
+            length,
+            meta.get("filename") or "upload",
+            meta.get("filetype") or "audio/wav",
+            user_id=user_id,
+            language=meta.get("language"),
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    if meta.get("stream", "").lower() == "true" and claim_transcription(state["id"]):
+        threading.Thread(target=_transcribe_resumable, args=(state["id"], True), daemon=True).start()
+
+    headers = _tus_headers(state)
+    # relative, so it keeps the client's scheme behind a TLS-terminating proxy
+    headers["Location"] = f"/uploads/{state['id']}"
+    return jsonify({"id": state["id"]}), 201, headers
+
+
+@app.route("/uploads/<upload_id>", methods=["HEAD", "GET", "PATCH"])
+def resumable_upload(upload_id):
+    """HEAD: current offset. PATCH: append a chunk at Upload-Offset. GET: status and transcript."""
+    if not valid_upload_id(upload_id):
+        return jsonify({"error": "Upload not found"}), 404
+    if request.method == "PATCH":
+        if request.headers.get("Content-Type") != "application/offset+octet-stream":
+            return jsonify({"error": "Content-Type must be application/offset+octet-stream"}), 415
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return jsonify({"error": "Upload-Offset header is required"}), 400
+        try:
+            # read from the raw stream so Werkzeug never spools the body
+            state = append_chunk(upload_id, offset, request.stream, request.headers.get("Upload-Checksum"))
+        except UploadError as e:
+            return jsonify({"error": str(e)}), e.status
+
+        # claiming is atomic, so a streaming transcription already in flight is not
+        # duplicated; one that failed early is retried on the complete file
+        if state["offset"] == state["length"] and claim_transcription(upload_id):
+            threading.Thread(target=_transcribe_resumable, args=(upload_id,), daemon=True).start()
+        return "", 204, _tus_headers(state)
+
+    state = load_state(upload_id)
+    if not state:
+        return jsonify({"error": "Upload not found"}), 404
+    if state["offset"] == state["length"] and claim_transcription(upload_id, statuses=()):
+        # the worker that claimed this upload died or hung; take over its stale claim
+        threading.Thread(target=_transcribe_resumable, args=(upload_id,), daemon=True).start()
+        state = load_state(upload_id)
+    if request.method == "HEAD":
+        return "", 200, _tus_headers(state)
+    return jsonify({
+        "id": state["id"],
+        "offset": state["offset"],
+        "length": state["length"],
+        "status": state["status"],
+        "sha256": state["sha256"],
+        "transcript": state["transcript"],
+        "error": state["error"],
+    }), 200, _tus_headers(state)
+
 
 # -------------------- Live progress SSE --------------------
 @app.route("/live-stream", methods=["GET"])
@@ -518,6 +785,146 @@ def get_transcripts():
     ])
 
 
+# -------------------- Seek transcript to audio --------------------
+@lru_cache(maxsize=int(os.getenv("SEEK_CACHE_SIZE", "64")))
+def _load_seek_index(source, transcript_id):
+    """Fetch and decode a transcript's word timings once; later seeks only bisect.
+
+    `source` is "supabase" or "local". The two number their rows independently,
+    so the source is part of the cache key. Raises KeyError when the row is not
+    in `source` and LookupError when it has no timings; neither is cached.
+    """
+    text, encoded = None, None
+    if source == "supabase":
+        row = get_transcript(transcript_id, "text,word_timings")
+        if row:
+            text, encoded = row.get("text"), row.get("word_timings")
+    else:
+        session = SessionLocal()
+        try:
+            t = session.query(Transcript).filter(Transcript.id == transcript_id).first()
+            if t:
+                text, encoded = t.text, t.word_timings
+        finally:
+            session.close()
+
+    if text is None:
+        raise KeyError("Transcript not found")
+    if not encoded:
+        raise LookupError("No word timings stored for this transcript")
+    return text, WordTimings(encoded)
+
+
+def _seek_index(transcript_id):
+    if get_supabase_client():
+        try:
+            return _load_seek_index("supabase", transcript_id)
+        except KeyError:
+            pass  # may be a row saved to the local fallback
+        except LookupError:
+            raise
+        except Exception:
+            pass  # Supabase unreachable
+    return _load_seek_index("local", transcript_id)
+
+
+@app.route("/transcripts/<int:transcript_id>/seek", methods=["GET"])
+def seek_transcript(transcript_id):
+    """Map a text offset (?offset=N) or search hit (?q=text) to an audio timestamp."""
+    offset_param = request.args.get("offset")
+    query = request.args.get("q")
+    if offset_param is None and not query:
+        return jsonify({"error": "Provide either offset or q"}), 400
+
+    try:
+        text, timings = _seek_index(transcript_id)
+    except LookupError as e:
+        return jsonify({"error": e.args[0]}), 404
+
+    if query:
+        # search the original text; lowercasing can change its length ("İ") and shift offsets
+        match = re.search(re.escape(query), text, re.IGNORECASE)
+        if not match:
+            return jsonify({"error": "Text not found in transcript"}), 404
+        offset = match.start()
+    else:
+        try:
+            offset = int(offset_param)
+        except ValueError:
+            return jsonify({"error": "offset must be an integer"}), 400
+        if offset < 0 or offset >= len(text):
+            return jsonify({"error": "offset out of range"}), 400
+
+    return jsonify(timings.lookup(offset))
+
+
+# -------------------- Usage rollups --------------------
+@app.route("/usage", methods=["GET"])
+def get_usage():
+    """The calling user's daily audio minutes, transcript count and provider calls.
+
+    Requires a bearer token. Query params: from / to as YYYY-MM-DD (inclusive).
+
+    `transcripts` counts recording sessions: one per /upload-file or resumable
+    upload, and one per live recording (counted at /stop-live, however many
+    chunks it had). `minutes` and `provider_calls` include every live chunk, and
+    `provider_calls` also counts each language-detection probe.
+    """
+    user_id = None
+    token = _extract_bearer(request)
+    try:
+        user = get_user_from_bearer(token) if token else None
+        user_id = user.get("id") if user else None
+    except Exception:
+        print("Warning: user resolution failed during /usage")
+    if not user_id:
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        start = datetime.strptime(request.args["from"], "%Y-%m-%d").date() if request.args.get("from") else None
+        end = datetime.strptime(request.args["to"], "%Y-%m-%d").date() if request.args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+
+    session = SessionLocal()
+    try:
+        query = session.query(UsageDaily).filter(UsageDaily.user_id == str(user_id))
+        if start:
+            query = query.filter(UsageDaily.day >= start)
+        if end:
+            query = query.filter(UsageDaily.day <= end)
+        rows = query.order_by(UsageDaily.day.desc()).all()
+    finally:
+        session.close()
+
+    days = [
+        {
+            "day": r.day.isoformat(),
+            "minutes": round(r.audio_seconds / 60.0, 3),
+            "transcripts": r.transcript_count,
+            "provider_calls": r.provider_calls,
+        }
+        for r in rows
+    ]
+    return jsonify({
+        "user_id": user_id,
+        "days": days,
+        "totals": {
+            "minutes": round(sum(r.audio_seconds for r in rows) / 60.0, 3),
+            "transcripts": sum(r.transcript_count for r in rows),
+            "provider_calls": sum(r.provider_calls for r in rows),
+        },
+    })
+
+
+# -------------------- Metrics --------------------
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "supabase_circuit": get_circuit_metrics(),
+    })
+
+
 # -------------------- Run Flask --------------------
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
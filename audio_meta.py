@@ -0,0 +1,54 @@
+"""Cheap audio duration probing from container headers.
+
+Reads only the header of WAV and FLAC files instead of decoding the audio.
+Returns None for formats it cannot read so callers can fall back to the
+duration reported by the transcription provider.
+"""
+import struct
+import wave
+from typing import BinaryIO, Optional
+
+
+def _wav_duration(f: BinaryIO) -> Optional[float]:
+    with wave.open(f, "rb") as w:
+        rate = w.getframerate()
+        return w.getnframes() / float(rate) if rate else None
+
+
+def _flac_duration(f: BinaryIO) -> Optional[float]:
+    # "fLaC" marker followed by the mandatory STREAMINFO metadata block
+    header = f.read(4 + 4 + 18)
+    if len(header) < 26 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return None
+    info = header[8:]
+    # bytes 10..17: 20-bit sample rate, 3-bit channels, 5-bit bps, 36-bit total samples
+    packed = struct.unpack(">Q", info[10:18])[0]
+    rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    return total_samples / float(rate) if rate and total_samples else None
+
+
+def probe_duration(f: BinaryIO) -> Optional[float]:
+    """Return the duration in seconds of a seekable audio stream, or None if unknown.
+
+    The stream position is restored before returning.
+    """
+    try:
+        pos = f.tell()
+    except Exception:
+        return None
+    try:
+        magic = f.read(4)
+        f.seek(pos)
+        if magic == b"RIFF":
+            return _wav_duration(f)
+        if magic == b"fLaC":
+            return _flac_duration(f)
+        return None
+    except Exception:
+        return None
+    finally:
+        try:
+            f.seek(pos)
+        except Exception:
+            pass
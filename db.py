@@ -31,6 +31,7 @@ class Transcript(Base):
     duration_seconds = Column(Float, nullable=True)
     filename = Column(String, nullable=True)
     language = Column(String, default="en")
+    word_timings = Column(Text, nullable=True)
 
 # Create tables
 Base.metadata.create_all(engine)
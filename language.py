@@ -0,0 +1,143 @@
+"""Language identification on a short audio probe and per-language model routing.
+
+Only the first LANGUAGE_PROBE_SECONDS of 16 kHz mono PCM are sent to Deepgram
+with `detect_language=true`; the result picks the model and language options
+for the single full transcription that follows.
+"""
+import io
+import os
+import wave
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import requests
+from pydub import AudioSegment
+
+logger = logging.getLogger("language")
+
+DEEPGRAM_LISTEN_URL = "https://api.deepgram.com/v1/listen"
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "en")
+LANGUAGE_PROBE_SECONDS = float(os.getenv("LANGUAGE_PROBE_SECONDS", "5"))
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MIN_CONFIDENCE", "0.5"))
+# Upper bound on bytes read from an upload for the probe; several seconds of any
+# compressed format and at least a few seconds of 48 kHz stereo PCM
+LANGUAGE_PROBE_MAX_BYTES = int(os.getenv("LANGUAGE_PROBE_MAX_BYTES", str(2 * 1024 * 1024)))
+# Live sessions stop probing and use DEFAULT_LANGUAGE after this many inconclusive probes
+LIVE_LANGUAGE_PROBES = int(os.getenv("LIVE_LANGUAGE_PROBES", "2"))
+PROBE_MODEL = "nova-2"  # broadest language coverage for identification
+FALLBACK_MODEL = "nova-2"
+
+
+class LanguageProbeError(Exception):
+    """The language probe request did not reach Deepgram or was rejected."""
+
+
+def _parse_model_map(value: str) -> Dict[str, str]:
+    models = {}
+    for pair in value.split(","):
+        lang, _, model = pair.partition("=")
+        if lang.strip() and model.strip():
+            models[lang.strip().lower()] = model.strip()
+    return models
+
+
+# nova-3 for English; everything else goes to FALLBACK_MODEL unless overridden,
+# e.g. DEEPGRAM_LANGUAGE_MODELS="en=nova-3,es=nova-3,hi=nova-2"
+LANGUAGE_MODELS = _parse_model_map(os.getenv("DEEPGRAM_LANGUAGE_MODELS", "en=nova-3"))
+
+
+def probe_clip(audio: AudioSegment) -> io.BytesIO:
+    """Return the first LANGUAGE_PROBE_SECONDS of `audio` as 16 kHz mono WAV."""
+    clip = audio[: int(LANGUAGE_PROBE_SECONDS * 1000)].set_frame_rate(16000).set_channels(1)
+    buf = io.BytesIO()
+    clip.export(buf, format="wav")
+    buf.seek(0)
+    return buf
+
+
+def _wav_prefix(f) -> AudioSegment:
+    """Read only the first LANGUAGE_PROBE_SECONDS of frames from a WAV stream."""
+    with wave.open(f, "rb") as w:
+        frames = w.readframes(int(LANGUAGE_PROBE_SECONDS * w.getframerate()))
+        return AudioSegment(
+            data=frames,
+            sample_width=w.getsampwidth(),
+            frame_rate=w.getframerate(),
+            channels=w.getnchannels(),
+        )
+
+
+def probe_clip_from_file(f) -> Optional[io.BytesIO]:
+    """Decode the start of an open audio file into a probe clip; None if it can't be decoded.
+
+    At most LANGUAGE_PROBE_MAX_BYTES are read (pydub would otherwise pipe the
+    whole file to ffmpeg), so containers that need their tail, such as MP4 with
+    the index at the end, may not decode. Prefer probe_clip_from_path when the
+    audio is on disk. The file position is restored before returning.
+    """
+    pos = f.tell()
+    try:
+        head = io.BytesIO(f.read(LANGUAGE_PROBE_MAX_BYTES))
+        if head.getvalue()[:4] == b"RIFF":
+            return probe_clip(_wav_prefix(head))
+        return probe_clip(AudioSegment.from_file(head, duration=LANGUAGE_PROBE_SECONDS))
+    except Exception as e:
+        logger.warning("Could not decode audio for language probe: %s", e)
+        return None
+    finally:
+        f.seek(pos)
+
+
+def probe_clip_from_path(path: str) -> Optional[io.BytesIO]:
+    """Decode the start of an audio file on disk into a probe clip; None if it can't be decoded.
+
+    ffmpeg reads the file itself and stops after LANGUAGE_PROBE_SECONDS, so
+    nothing beyond the probe window is loaded into memory.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(4) == b"RIFF":
+                f.seek(0)
+                return probe_clip(_wav_prefix(f))
+        # given a path, pydub passes it to ffmpeg with -t instead of piping the file
+        return probe_clip(AudioSegment.from_file(path, duration=LANGUAGE_PROBE_SECONDS))
+    except Exception as e:
+        logger.warning("Could not decode audio for language probe: %s", e)
+        return None
+
+
+def detect_language(wav: io.BytesIO, api_key: str, timeout: float = 10.0) -> Optional[str]:
+    """Run Deepgram language identification on a short WAV clip.
+
+    Returns the language code, or None when the result is missing or not
+    confident. Raises LanguageProbeError when the request itself fails.
+    """
+    url = f"{DEEPGRAM_LISTEN_URL}?{urlencode({'model': PROBE_MODEL, 'detect_language': 'true'})}"
+    headers = {"Authorization": f"Token {api_key}", "Content-Type": "audio/wav"}
+    try:
+        response = requests.post(url, headers=headers, data=wav, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise LanguageProbeError(str(e)) from e
+    try:
+        channel = response.json().get("results", {}).get("channels", [{}])[0]
+    except (ValueError, AttributeError, IndexError) as e:
+        logger.warning("Unreadable language probe response: %s", e)
+        return None
+    language = channel.get("detected_language")
+    confidence = channel.get("language_confidence")
+    if not language or (confidence is not None and confidence < LANGUAGE_MIN_CONFIDENCE):
+        return None
+    return language.lower()
+
+
+def route(language: Optional[str]) -> Dict[str, str]:
+    """Pick the Deepgram model and language options for `language`."""
+    language = (language or DEFAULT_LANGUAGE).lower()
+    model = LANGUAGE_MODELS.get(language) or LANGUAGE_MODELS.get(language.split("-")[0]) or FALLBACK_MODEL
+    return {"model": model, "language": language}
+
+
+def listen_url(options: Dict[str, str]) -> str:
+    return f"{DEEPGRAM_LISTEN_URL}?{urlencode({**options, 'smart_format': 'true'})}"
@@ -0,0 +1,127 @@
+"""Response shaping, fast JSON encoding and compression for the Flask app.
+
+orjson and brotli are optional: without them the app falls back to Flask's
+stdlib JSON encoder and to gzip-only compression.
+"""
+import gzip
+from typing import Dict, Optional
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from timings import WordTimings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional speedup
+    brotli = None
+
+RESPONSE_MODES = ("minimal", "timings", "full")
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well below max; favours speed for per-request compression
+_COMPRESSIBLE = ("application/json", "text/")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Only dumps() is overridden; the base class builds jsonify() responses from it.
+    """
+
+    _options = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._options).decode("utf-8")
+
+
+def shape_transcript_response(
+    mode: str,
+    transcript: str,
+    result: Dict,
+    word_timings: Optional[str] = None,
+    duration_seconds: Optional[float] = None,
+    language: Optional[str] = None,
+) -> Dict:
+    """Build the upload response body for a `minimal`, `timings` or `full` mode."""
+    body = {"transcript": transcript}
+    if mode == "minimal":
+        return body
+    body["duration_seconds"] = duration_seconds
+    body["language"] = language
+    if mode == "timings":
+        # columnar arrays (seconds) instead of one object per word
+        if word_timings:
+            wt = WordTimings(word_timings)
+            body["words"] = {
+                "offsets": wt.offsets.tolist(),
+                "starts": [s / 1000.0 for s in wt.starts],
+                "ends": [e / 1000.0 for e in wt.ends],
+            }
+            body["segments"] = wt.segments.tolist()
+        else:
+            body["words"] = {"offsets": [], "starts": [], "ends": []}
+            body["segments"] = []
+        return body
+    body["deepgram_response"] = result
+    return body
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the available encoding with the highest q-value; br wins ties."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in (("br", "gzip") if brotli else ("gzip",)):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encode compressible bodies the client accepts."""
+    response.vary.add("Accept-Encoding")
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(_COMPRESSIBLE)
+    ):
+        return response
+
+    encoding = _pick_encoding(request.headers.get("Accept-Encoding", ""))
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
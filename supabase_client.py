@@ -1,21 +1,31 @@
 import os
+import time
 import logging
+import threading
 from supabase import create_client
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+
+import requests
+
+try:
+    import httpx
+    _TRANSPORT_ERRORS = (httpx.TransportError, requests.exceptions.ConnectionError, requests.exceptions.Timeout, OSError)
+except ImportError:  # pragma: no cover - httpx ships with supabase-py
+    _TRANSPORT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, OSError)
 
 _client = None
 
+# Columns returned by transcript listings; word_timings is only read by the seek endpoint
+TRANSCRIPT_LIST_COLUMNS = "id,text,user_id,created_at,duration_seconds,filename,language"
+
 logger = logging.getLogger("supabase_client")
 if not logger.handlers:
     # basic configuration if not already configured by the app
     logging.basicConfig(level=logging.INFO)
 
 
-def get_supabase_client() -> Optional[Any]:
-    """Create and cache a Supabase client. Returns None if required env vars missing.
-
-    This helper intentionally does not raise so callers can fallback to local DB.
-    """
+def _create_client() -> Optional[Any]:
+    """Create and cache the raw Supabase client, ignoring the circuit breaker."""
     global _client
     if _client:
         return _client
@@ -36,6 +46,191 @@ def get_supabase_client() -> Optional[Any]:
         return None
 
 
+class _CircuitBreaker:
+    """Tracks Supabase health so callers can skip it during an outage.
+
+    The breaker opens after `failure_threshold` consecutive failed or slow calls.
+    While open, get_supabase_client() returns None so every caller takes its
+    local DB path immediately. A background thread probes Supabase every
+    `probe_interval` seconds and closes the breaker on the first healthy probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, slow_call_seconds: float, probe_interval: float):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+        self.counters = {
+            "calls": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "short_circuited": 0,
+            "times_opened": 0,
+            "probes": 0,
+            "probe_failures": 0,
+        }
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.counters["short_circuited"] += 1
+            return False
+
+    def record_success(self, elapsed: float) -> None:
+        if elapsed > self.slow_call_seconds:
+            self.record_failure(f"slow call ({elapsed:.2f}s)", slow=True)
+            return
+        with self._lock:
+            self.counters["calls"] += 1
+            self.consecutive_failures = 0
+
+    def record_failure(self, reason: str, slow: bool = False) -> None:
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["slow_calls" if slow else "failures"] += 1
+            self.consecutive_failures += 1
+            self.last_failure = reason
+            should_open = self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            if should_open:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.counters["times_opened"] += 1
+        if should_open:
+            logger.warning("Supabase circuit opened after %d consecutive failures (last: %s)", self.consecutive_failures, reason)
+            self._start_probe()
+
+    def _start_probe(self) -> None:
+        with self._lock:
+            if self._probe_thread and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="supabase-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self.state = self.HALF_OPEN
+                self.counters["probes"] += 1
+            start = time.monotonic()
+            try:
+                client = _create_client()
+                if not client:
+                    raise RuntimeError("Supabase client unavailable")
+                client.table("transcripts").select("id").limit(1).execute()
+                healthy = time.monotonic() - start <= self.slow_call_seconds
+            except Exception as e:
+                logger.debug("Supabase probe failed: %s", e)
+                # a 4xx (e.g. RLS denial) still proves Supabase is reachable
+                healthy = not _is_outage(e) and time.monotonic() - start <= self.slow_call_seconds
+            with self._lock:
+                if healthy:
+                    self.state = self.CLOSED
+                    self.consecutive_failures = 0
+                    self.opened_at = None
+                else:
+                    self.state = self.OPEN
+                    self.counters["probe_failures"] += 1
+            if healthy:
+                logger.info("Supabase probe succeeded; circuit closed")
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opened_at": self.opened_at,
+                "last_failure": self.last_failure,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_seconds": self.slow_call_seconds,
+                "probe_interval": self.probe_interval,
+                **self.counters,
+            }
+
+
+_breaker = _CircuitBreaker(
+    failure_threshold=int(os.getenv("SUPABASE_BREAKER_FAILURES", "3")),
+    slow_call_seconds=float(os.getenv("SUPABASE_SLOW_CALL_SECONDS", "2.0")),
+    probe_interval=float(os.getenv("SUPABASE_PROBE_INTERVAL", "15")),
+)
+
+
+def _status_of(exc: Exception) -> Optional[int]:
+    """Best-effort HTTP status of an auth/PostgREST/HTTP error, or None if unknown."""
+    response = getattr(exc, "response", None)
+    for value in (getattr(exc, "status", None), getattr(exc, "status_code", None),
+                  getattr(response, "status_code", None), getattr(exc, "code", None)):
+        # PostgREST puts the HTTP status in `code` when the body isn't JSON
+        try:
+            status = int(value)
+        except (TypeError, ValueError):
+            continue
+        if 100 <= status <= 599:
+            return status
+    return None
+
+
+def _is_outage(exc: Exception) -> bool:
+    """Whether an exception means Supabase is unhealthy, as opposed to a bad request.
+
+    Only transport errors, timeouts and 5xx responses count. Auth errors for bad
+    tokens and PostgREST 4xx errors (RLS denials, unknown columns) mean Supabase
+    answered, so they must not open the circuit for everyone.
+    """
+    if isinstance(exc, _TRANSPORT_ERRORS) or type(exc).__name__ == "AuthRetryableError":
+        return True
+    status = _status_of(exc)
+    return status is not None and status >= 500
+
+
+def _guarded(fn: Callable[[], Any]) -> Any:
+    """Run a Supabase call, feeding its outcome and latency into the breaker."""
+    start = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        if _is_outage(e):
+            _breaker.record_failure(str(e))
+        else:
+            _breaker.record_success(time.monotonic() - start)
+        raise
+    _breaker.record_success(time.monotonic() - start)
+    return result
+
+
+def is_circuit_open() -> bool:
+    return _breaker.state != _CircuitBreaker.CLOSED
+
+
+def get_circuit_metrics() -> Dict[str, Any]:
+    """Return a snapshot of the Supabase circuit breaker for the metrics endpoint."""
+    return _breaker.snapshot()
+
+
+def get_supabase_client() -> Optional[Any]:
+    """Create and cache a Supabase client. Returns None if required env vars missing.
+
+    Also returns None while the circuit breaker is open, so callers go straight
+    to their local DB fallback instead of waiting on a failing Supabase.
+    This helper intentionally does not raise so callers can fallback to local DB.
+    """
+    client = _create_client()
+    if not client or not _breaker.allow():
+        return None
+    return client
+
+
 def _unwrap_response(resp: Any) -> Any:
     """Normalize responses from different supabase-py versions.
 
@@ -68,7 +263,7 @@ def insert_transcript(record: Dict) -> Optional[Dict]:
         return None
     try:
         print("Record - ", record)
-        resp = supabase.table("transcripts").insert(record).execute()
+        resp = _guarded(lambda: supabase.table("transcripts").insert(record).execute())
         normalized = _unwrap_response(resp)
         if normalized.get("error"):
             logger.error("Supabase insert error: %s | record=%s", normalized.get("error"), record)
@@ -85,7 +280,7 @@ def get_transcripts_for_user(user_id: str) -> List[Dict]:
     if not supabase:
         return []
     try:
-        resp = supabase.table("transcripts").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        resp = _guarded(lambda: supabase.table("transcripts").select(TRANSCRIPT_LIST_COLUMNS).eq("user_id", user_id).order("created_at", desc=True).execute())
         normalized = _unwrap_response(resp)
         return normalized.get("data") or []
     except Exception as e:
@@ -98,7 +293,7 @@ def get_all_transcripts() -> List[Dict]:
     if not supabase:
         return []
     try:
-        resp = supabase.table("transcripts").select("*").order("created_at", desc=True).execute()
+        resp = _guarded(lambda: supabase.table("transcripts").select(TRANSCRIPT_LIST_COLUMNS).order("created_at", desc=True).execute())
         normalized = _unwrap_response(resp)
         return normalized.get("data") or []
     except Exception as e:
@@ -106,6 +301,20 @@ def get_all_transcripts() -> List[Dict]:
         return []
 
 
+def get_transcript(transcript_id: Any, columns: str = "*") -> Optional[Dict]:
+    supabase = get_supabase_client()
+    if not supabase:
+        return None
+    try:
+        resp = _guarded(lambda: supabase.table("transcripts").select(columns).eq("id", transcript_id).limit(1).execute())
+        normalized = _unwrap_response(resp)
+        rows = normalized.get("data") or []
+        return rows[0] if rows else None
+    except Exception as e:
+        logger.exception("Failed to fetch transcript %s: %s", transcript_id, e)
+        return None
+
+
 def get_user_from_bearer(token: str) -> Optional[Dict]:
     """Try to resolve a Supabase user from a Bearer token.
 
@@ -113,8 +322,10 @@ def get_user_from_bearer(token: str) -> Optional[Dict]:
     This prefers using the Supabase admin endpoint if available, falling back to
     the client.auth.api.get_user_by_token style call depending on supabase-py version.
     """
+    if not token:
+        return None
     supabase = get_supabase_client()
-    if not supabase or not token:
+    if not supabase and not is_circuit_open():
         return None
 
     def _decode_jwt_unverified(jwt_token: str) -> Optional[Dict]:
@@ -144,10 +355,14 @@ def get_user_from_bearer(token: str) -> Optional[Dict]:
             return None
 
     try:
+        # While the circuit is open, skip the network lookups and decode locally
+        if not supabase:
+            raise LookupError("Supabase circuit open")
+
         # Newer supabase-py exposes auth.get_user(jwt)
         if hasattr(supabase.auth, "get_user"):  # returns { data: { user }, error }
             try:
-                resp = supabase.auth.get_user(token)
+                resp = _guarded(lambda: supabase.auth.get_user(token))
             except Exception:
                 # network failure or misconfigured URL
                 logger.exception("Failed to resolve  user from token")
@@ -175,13 +390,14 @@ def get_user_from_bearer(token: str) -> Optional[Dict]:
         service_key = os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         if url and service_key:
             try:
-                import requests
                 headers = {"Authorization": f"Bearer {token}", "apikey": service_key}
                 r = requests.get(f"{url}/auth/v1/user", headers=headers, timeout=5)
                 if r.status_code == 200:
                     return r.json()
             except Exception:
                 logger.exception("Failed to call /auth/v1/user")
+    except LookupError:
+        pass
     except Exception:
         logger.exception("Unexpected error when resolving user from token")
 
@@ -0,0 +1,76 @@
+from timings import WordTimings, _align_offsets, encode_word_timings, extract_words
+
+
+def _words(*spec):
+    return [{"word": w.lower().strip(".,?!"), "punctuated_word": w, "start": s, "end": e} for w, s, e in spec]
+
+
+def test_round_trip_lookup():
+    transcript = "Hello world. How are you?"
+    words = _words(("Hello", 0.0, 0.4), ("world.", 0.5, 0.9), ("How", 2.5, 2.7), ("are", 2.8, 2.9), ("you?", 3.0, 3.3))
+    wt = WordTimings(encode_word_timings(transcript, words))
+
+    assert len(wt) == 5
+    assert wt.offsets.tolist() == [0, 6, 13, 17, 21]
+    assert wt.starts.tolist() == [0, 500, 2500, 2800, 3000]
+    assert wt.ends.tolist() == [400, 900, 2700, 2900, 3300]
+    assert wt.segments.tolist() == [0, 2]
+
+    hit = wt.lookup(transcript.index("are") + 1)
+    assert hit["word_index"] == 3
+    assert (hit["start"], hit["end"]) == (2.8, 2.9)
+    assert hit["segment"] == {"index": 1, "start": 2.5, "end": 3.3}
+
+
+def test_segment_split_on_long_pause():
+    words = _words(("one", 0.0, 0.2), ("two", 0.3, 0.5), ("three", 2.0, 2.2))
+    wt = WordTimings(encode_word_timings("one two three", words))
+    assert wt.segments.tolist() == [0, 2]
+
+
+def test_segment_end_is_latest_word_end():
+    words = _words(("long", 0.0, 3.0), ("short", 1.0, 2.0))
+    wt = WordTimings(encode_word_timings("long short", words))
+    assert wt.lookup(0)["segment"]["end"] == 3.0
+
+
+def test_starts_never_go_backwards():
+    words = _words(("a", 1.0, 1.2), ("b", 0.5, 0.7))
+    wt = WordTimings(encode_word_timings("a b", words))
+    assert wt.starts.tolist() == [1000, 1000]
+    assert wt.ends.tolist() == [1200, 1000]
+
+
+def test_offset_before_first_word_maps_to_first_word():
+    wt = WordTimings(encode_word_timings("  hi there", _words(("hi", 0.0, 0.1), ("there", 0.2, 0.3))))
+    assert wt.lookup(0)["word_index"] == 0
+
+
+def test_empty_input_encodes_to_none():
+    assert encode_word_timings("", _words(("a", 0, 1))) is None
+    assert encode_word_timings("a", []) is None
+
+
+def test_align_matches_whole_tokens_not_substrings():
+    # "a" must not match the "a" inside "cat"
+    assert _align_offsets("cat a", _words(("cat", 0, 1), ("a", 1, 2))) == [0, 4]
+
+
+def test_align_resyncs_after_rewritten_span():
+    transcript = "it costs $5 today"
+    words = _words(("it", 0, 1), ("costs", 1, 2), ("five", 2, 3), ("dollars", 3, 4), ("today", 4, 5))
+    # both rewritten words point at "$5"; "today" lines up again
+    assert _align_offsets(transcript, words) == [0, 3, 9, 9, 12]
+
+    wt = WordTimings(encode_word_timings(transcript, words))
+    assert wt.word_at(transcript.index("$5")) == 2
+
+
+def test_align_pins_trailing_words_when_text_runs_out():
+    assert _align_offsets("one", _words(("one", 0, 1), ("two", 1, 2))) == [0, 0]
+
+
+def test_extract_words_tolerates_missing_fields():
+    assert extract_words({}) == []
+    words = [{"word": "hi", "start": 0, "end": 1}]
+    assert extract_words({"results": {"channels": [{"alternatives": [{"words": words}]}]}}) == words
@@ -0,0 +1,144 @@
+import base64
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+import uploads
+from uploads import UploadError
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(uploads, "_upload_locks", {})
+    monkeypatch.setattr(uploads, "_hashers", {})
+    return tmp_path
+
+
+def _new(data=b"abcdef"):
+    return uploads.create_upload(len(data), "a.wav", "audio/wav")["id"]
+
+
+def test_append_chunks_to_completion():
+    upload_id = _new()
+    state = uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc"))
+    assert state["offset"] == 3 and state["sha256"] is None
+    state = uploads.append_chunk(upload_id, 3, io.BytesIO(b"def"))
+    assert state["offset"] == 6
+    assert state["sha256"] == hashlib.sha256(b"abcdef").hexdigest()
+    with uploads.open_upload(upload_id) as f:
+        assert f.read() == b"abcdef"
+
+
+def test_sha256_survives_restart():
+    upload_id = _new()
+    uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc"))
+    uploads._hashers.clear()
+    state = uploads.append_chunk(upload_id, 3, io.BytesIO(b"def"))
+    assert state["sha256"] == hashlib.sha256(b"abcdef").hexdigest()
+
+
+def test_append_rejects_wrong_offset_and_overflow():
+    upload_id = _new()
+    with pytest.raises(UploadError) as e:
+        uploads.append_chunk(upload_id, 2, io.BytesIO(b"abc"))
+    assert e.value.status == 409
+    with pytest.raises(UploadError) as e:
+        uploads.append_chunk(upload_id, 0, io.BytesIO(b"abcdefgh"))
+    assert e.value.status == 413
+    assert uploads.load_state(upload_id)["offset"] == 0
+
+
+def test_append_verifies_chunk_checksum():
+    upload_id = _new()
+    bad = "sha1 " + base64.b64encode(hashlib.sha1(b"xyz").digest()).decode()
+    with pytest.raises(UploadError) as e:
+        uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc"), bad)
+    assert e.value.status == 460
+    assert os.path.getsize(uploads.upload_path(upload_id)) == 0
+
+    good = "sha1 " + base64.b64encode(hashlib.sha1(b"abc").digest()).decode()
+    assert uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc"), good)["offset"] == 3
+
+    with pytest.raises(UploadError):
+        uploads.append_chunk(upload_id, 3, io.BytesIO(b"def"), "crc32 AAAA")
+
+
+def test_unknown_upload_gets_no_lock():
+    for upload_id in ("0" * 32, "not-an-id", "../etc"):
+        with pytest.raises(UploadError) as e:
+            uploads.append_chunk(upload_id, 0, io.BytesIO(b"a"))
+        assert e.value.status == 404
+    assert uploads._upload_locks == {}
+
+
+def test_claim_is_exclusive():
+    upload_id = _new()
+    assert uploads.claim_transcription(upload_id)
+    assert not uploads.claim_transcription(upload_id)
+    assert uploads.load_state(upload_id)["claimed_at"]
+
+    uploads.update_state(upload_id, status="completed")
+    assert not uploads.claim_transcription(upload_id)
+
+
+def test_stale_claim_can_be_taken_over():
+    upload_id = _new()
+    assert uploads.claim_transcription(upload_id)
+    assert not uploads.claim_transcription(upload_id, statuses=())
+
+    uploads.update_state(upload_id, claimed_at=time.time() - uploads.CLAIM_STALE_SECONDS - 1)
+    assert uploads.claim_transcription(upload_id, statuses=())
+    assert not uploads.claim_is_stale(uploads.load_state(upload_id))
+
+
+def test_streaming_failure_before_last_chunk_releases_claim():
+    upload_id = _new()
+    uploads.append_chunk(upload_id, 0, io.BytesIO(b"abc"))
+    assert uploads.claim_transcription(upload_id)
+
+    assert not uploads.streaming_failed(upload_id, "boom")
+    state = uploads.load_state(upload_id)
+    assert (state["status"], state["error"]) == ("failed", "boom")
+
+    uploads.append_chunk(upload_id, 3, io.BytesIO(b"def"))
+    assert uploads.claim_transcription(upload_id)
+    assert uploads.load_state(upload_id)["error"] is None
+
+
+def test_streaming_failure_after_last_chunk_keeps_claim():
+    upload_id = _new()
+    assert uploads.claim_transcription(upload_id)
+    uploads.append_chunk(upload_id, 0, io.BytesIO(b"abcdef"))
+
+    assert uploads.streaming_failed(upload_id, "boom")
+    assert uploads.load_state(upload_id)["status"] == "transcribing"
+
+
+def test_sweep_removes_only_expired_uploads(upload_dir):
+    old_id, fresh_id = _new(), _new()
+    past = time.time() - uploads.UPLOAD_TTL_SECONDS - 60
+    for path in (uploads.upload_path(old_id), uploads._state_path(old_id)):
+        os.utime(path, (past, past))
+
+    assert uploads.sweep_expired() == 1
+    assert uploads.load_state(old_id) is None
+    assert not os.path.exists(uploads.upload_path(old_id))
+    assert uploads.load_state(fresh_id) is not None
+
+
+def test_discard_data_keeps_state():
+    upload_id = _new()
+    uploads.discard_data(upload_id)
+    assert not os.path.exists(uploads.upload_path(upload_id))
+    assert uploads.load_state(upload_id)["id"] == upload_id
+
+
+def test_parse_metadata():
+    header = "filename " + base64.b64encode(b"talk.wav").decode() + ",stream"
+    assert uploads.parse_metadata(header) == {"filename": "talk.wav", "stream": ""}
+    with pytest.raises(UploadError):
+        uploads.parse_metadata("filename abc")  # bad padding
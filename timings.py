@@ -0,0 +1,206 @@
+"""Compact word/segment timing index for transcript-to-audio seeking.
+
+Per-word timings from Deepgram are stored as parallel arrays instead of a JSON
+dict per word:
+
+- offsets:  character offset of each word in the transcript text
+- starts:   word start time in milliseconds
+- ends:     word end time in milliseconds
+- segments: index of the first word of each segment (sentence / pause)
+
+Each array is delta-encoded as uint32, concatenated and zlib-compressed, then
+base64-encoded so it fits a plain text column in both SQLite and Supabase.
+An hour-long recording (~9k words) encodes to a few tens of KB.
+"""
+import base64
+import re
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+_MAGIC = b"WT1"
+_HEADER = struct.Struct("<3sII")  # magic, word count, segment count
+
+# Start a new segment after sentence-ending punctuation or a long pause
+_SENTENCE_END = re.compile(r"[.?!]$")
+_SEGMENT_GAP_MS = 1000
+
+
+def _deltas(values: List[int]) -> array:
+    out = array("I")
+    prev = 0
+    for v in values:
+        out.append(v - prev)
+        prev = v
+    return out
+
+
+def _undeltas(arr: array) -> array:
+    out = array("I")
+    total = 0
+    for v in arr:
+        total += v
+        out.append(total)
+    return out
+
+
+def extract_words(deepgram_result: Dict) -> List[Dict]:
+    """Return the word list of the first channel/alternative of a Deepgram response."""
+    try:
+        return deepgram_result["results"]["channels"][0]["alternatives"][0].get("words") or []
+    except (KeyError, IndexError, TypeError):
+        return []
+
+
+_TOKEN = re.compile(r"\S+")
+_NON_WORD = re.compile(r"[^\w']+")
+_RESYNC_WINDOW = 4
+
+
+def _norm(token: str) -> str:
+    return _NON_WORD.sub("", token.lower())
+
+
+def _align_offsets(transcript: str, words: List[Dict]) -> List[int]:
+    """Character offset in `transcript` of each Deepgram word.
+
+    Words are matched against whole whitespace-separated tokens, never substrings.
+    When smart_format rewrites a span ("five dollars" -> "$5"), the words up to the
+    next word/token pair that matches again all get the offset of the span's first
+    token, so a seek on the rewritten text lands on the first word of the span.
+    """
+    tokens = [(m.start(), _norm(m.group())) for m in _TOKEN.finditer(transcript)]
+    keys = [_norm(w.get("punctuated_word") or w.get("word") or "") for w in words]
+    offsets: List[int] = []
+    t = 0
+    i = 0
+    while i < len(words):
+        if t >= len(tokens):
+            # text ran out; pin the remaining words to the last token
+            offsets.append(tokens[-1][0] if tokens else 0)
+            i += 1
+            continue
+        if keys[i] and keys[i] == tokens[t][1]:
+            offsets.append(tokens[t][0])
+            t += 1
+            i += 1
+            continue
+
+        # find the nearest point where words and tokens line up again
+        resync = None
+        for distance in range(1, 2 * _RESYNC_WINDOW + 1):
+            for dj in range(1, min(distance, _RESYNC_WINDOW) + 1):
+                du = distance - dj
+                j, u = i + dj, t + du
+                if du > _RESYNC_WINDOW or j >= len(words) or u >= len(tokens):
+                    continue
+                if keys[j] and keys[j] == tokens[u][1]:
+                    resync = (j, u)
+                    break
+            if resync:
+                break
+
+        span_start = tokens[t][0]
+        if resync:
+            j, u = resync
+            offsets.extend([span_start] * (j - i))
+            i, t = j, u
+        else:
+            offsets.append(span_start)
+            i += 1
+    return offsets
+
+
+def encode_word_timings(transcript: str, words: List[Dict]) -> Optional[str]:
+    """Align Deepgram words to `transcript` and pack them into the compact encoding.
+
+    Returns None when there are no words to index.
+    """
+    if not transcript or not words:
+        return None
+
+    offsets = _align_offsets(transcript, words)
+    starts, ends, segments = [], [], []
+    prev_end = 0
+    prev_token = ""
+    for w in words:
+        token = w.get("punctuated_word") or w.get("word") or ""
+        # deltas are unsigned, so starts must never go backwards
+        start_ms = max(int(round(float(w.get("start", 0)) * 1000)), starts[-1] if starts else 0)
+        end_ms = max(int(round(float(w.get("end", 0)) * 1000)), start_ms)
+        if not starts or _SENTENCE_END.search(prev_token) or start_ms - prev_end > _SEGMENT_GAP_MS:
+            segments.append(len(starts))
+        starts.append(start_ms)
+        ends.append(end_ms)
+        prev_end = end_ms
+        prev_token = token
+
+    # ends can overlap the next word and go backwards, so store durations instead
+    durations = array("I", (e - s for s, e in zip(starts, ends)))
+    payload = (
+        _HEADER.pack(_MAGIC, len(offsets), len(segments))
+        + _deltas(offsets).tobytes()
+        + _deltas(starts).tobytes()
+        + durations.tobytes()
+        + _deltas(segments).tobytes()
+    )
+    return base64.b64encode(zlib.compress(payload, 9)).decode("ascii")
+
+
+class WordTimings:
+    """Decoded timing index supporting O(log n) offset -> timestamp lookups."""
+
+    def __init__(self, encoded: str):
+        raw = zlib.decompress(base64.b64decode(encoded))
+        magic, n_words, n_segments = _HEADER.unpack_from(raw)
+        if magic != _MAGIC:
+            raise ValueError("Unknown word timing encoding")
+        pos = _HEADER.size
+
+        def _take(n: int) -> array:
+            nonlocal pos
+            arr = array("I")
+            arr.frombytes(raw[pos:pos + n * 4])
+            pos += n * 4
+            return arr
+
+        self.offsets = _undeltas(_take(n_words))
+        self.starts = _undeltas(_take(n_words))
+        durations = _take(n_words)
+        self.ends = array("I", (s + d for s, d in zip(self.starts, durations)))
+        self.segments = _undeltas(_take(n_segments))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def word_at(self, offset: int) -> int:
+        """Index of the word containing (or immediately preceding) text `offset`.
+
+        Words of a rewritten span share an offset; the first of them is returned.
+        """
+        i = max(bisect_right(self.offsets, offset) - 1, 0)
+        return bisect_left(self.offsets, self.offsets[i], 0, i + 1)
+
+    def segment_of(self, word_index: int) -> int:
+        return max(bisect_right(self.segments, word_index) - 1, 0)
+
+    def lookup(self, offset: int) -> Dict:
+        """Map a character offset in the transcript to audio timestamps (seconds)."""
+        i = self.word_at(offset)
+        seg = self.segment_of(i)
+        seg_first = self.segments[seg]
+        seg_last = (self.segments[seg + 1] - 1) if seg + 1 < len(self.segments) else len(self) - 1
+        return {
+            "offset": offset,
+            "word_index": i,
+            "start": self.starts[i] / 1000.0,
+            "end": self.ends[i] / 1000.0,
+            "segment": {
+                "index": seg,
+                "start": self.starts[seg_first] / 1000.0,
+                # an earlier word can end after the last one starts
+                "end": max(self.ends[seg_first:seg_last + 1]) / 1000.0,
+            },
+        }
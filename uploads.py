@@ -0,0 +1,382 @@
+"""Disk-backed state for resumable (tus-style) uploads.
+
+Each upload is a data file plus a JSON sidecar under UPLOAD_DIR. Chunks from
+PATCH requests are streamed straight onto the end of the data file, and a
+sha256 of the received bytes is kept up to date as they arrive so the final
+checksum is available as soon as the last chunk lands.
+
+The data file is deleted once its transcript is saved. Uploads with no
+activity for UPLOAD_TTL_SECONDS (abandoned, failed, or finished status
+records) are swept when new uploads are created.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+CHUNK_SIZE = 1024 * 1024
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256")
+UPLOAD_TTL_SECONDS = float(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+SWEEP_INTERVAL_SECONDS = 600
+# A transcription claim whose worker has not refreshed `claimed_at` for this long
+# (crash, restart, hang) can be taken over by another caller
+CLAIM_STALE_SECONDS = float(os.getenv("UPLOAD_CLAIM_STALE_SECONDS", "300"))
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+_state_lock = threading.Lock()
+_last_sweep = 0.0
+_upload_locks: Dict[str, threading.Lock] = {}
+# upload_id -> (hasher, bytes hashed); rebuilt from disk after a restart
+_hashers: Dict[str, Any] = {}
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def valid_upload_id(upload_id: str) -> bool:
+    """Whether `upload_id` has the shape of an id issued by create_upload."""
+    return bool(_UPLOAD_ID.fullmatch(upload_id or ""))
+
+
+def _data_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def _state_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.json")
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    with _state_lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def parse_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Parse a tus Upload-Metadata header ("key base64value,key2 base64value2")."""
+    meta = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            meta[parts[0]] = base64.b64decode(parts[1]).decode("utf-8") if len(parts) > 1 else ""
+        except Exception:
+            raise UploadError(f"Invalid Upload-Metadata value for {parts[0]}")
+    return meta
+
+
+def load_state(upload_id: str) -> Optional[Dict]:
+    try:
+        with open(_state_path(upload_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(state: Dict) -> None:
+    tmp = _state_path(state["id"]) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(state["id"]))
+
+
+def update_state(upload_id: str, **fields) -> Dict:
+    with _state_lock:
+        state = load_state(upload_id) or {}
+        state.update(fields)
+        _write_state(state)
+        return state
+
+
+def claim_is_stale(state: Dict, now: Optional[float] = None) -> bool:
+    """Whether a "transcribing" claim has stopped being refreshed by its worker."""
+    if state.get("status") != "transcribing":
+        return False
+    return (now or time.time()) - (state.get("claimed_at") or 0) > CLAIM_STALE_SECONDS
+
+
+def claim_transcription(upload_id: str, statuses=("uploading", "failed")) -> bool:
+    """Atomically move an upload to "transcribing" so only one caller starts a transcription.
+
+    Uploads in one of `statuses` can be claimed, as can "transcribing" uploads
+    whose claim went stale because the worker died or hung. A live claim or a
+    completed upload cannot.
+    """
+    with _state_lock:
+        state = load_state(upload_id)
+        if not state or not (state.get("status") in statuses or claim_is_stale(state)):
+            return False
+        state.update(status="transcribing", error=None, claimed_at=time.time())
+        _write_state(state)
+        return True
+
+
+@contextmanager
+def holding_claim(upload_id: str):
+    """Refresh the upload's `claimed_at` in the background while the block runs."""
+    stop = threading.Event()
+
+    def _beat():
+        while not stop.wait(CLAIM_STALE_SECONDS / 3):
+            with _state_lock:
+                state = load_state(upload_id)
+                if not state or state.get("status") != "transcribing":
+                    return
+                state["claimed_at"] = time.time()
+                _write_state(state)
+
+    threading.Thread(target=_beat, name=f"upload-claim-{upload_id}", daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def streaming_failed(upload_id: str, error: str) -> bool:
+    """Record a failed streaming transcription.
+
+    Returns True when the whole file is already on disk, in which case the caller
+    keeps its claim and should retry from the file. Otherwise the upload is marked
+    "failed" so the PATCH that delivers the final chunk can claim it again.
+    """
+    with _state_lock:
+        state = load_state(upload_id) or {}
+        if state.get("length") and state.get("offset") == state.get("length"):
+            return True
+        state.update(status="failed", error=error)
+        _write_state(state)
+        return False
+
+
+def _forget(upload_id: str) -> None:
+    with _state_lock:
+        _upload_locks.pop(upload_id, None)
+    _hashers.pop(upload_id, None)
+
+
+def discard_data(upload_id: str) -> None:
+    """Delete an upload's data file, keeping its state so the status stays pollable."""
+    try:
+        os.remove(_data_path(upload_id))
+    except OSError:
+        pass
+    _forget(upload_id)
+
+
+def sweep_expired(now: Optional[float] = None) -> int:
+    """Delete data and state of uploads with no activity for UPLOAD_TTL_SECONDS.
+
+    Returns the number of uploads removed.
+    """
+    now = now or time.time()
+    removed = 0
+    try:
+        names = os.listdir(UPLOAD_DIR)
+    except OSError:
+        return 0
+    upload_ids = {name.split(".", 1)[0] for name in names if name.endswith((".part", ".json"))}
+    for upload_id in upload_ids:
+        paths = [p for p in (_data_path(upload_id), _state_path(upload_id)) if os.path.exists(p)]
+        try:
+            last_activity = max(os.path.getmtime(p) for p in paths)
+        except (OSError, ValueError):
+            continue
+        if now - last_activity < UPLOAD_TTL_SECONDS:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _forget(upload_id)
+        removed += 1
+    return removed
+
+
+def _maybe_sweep() -> None:
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+        return
+    _last_sweep = now
+    sweep_expired(now)
+
+
+def create_upload(
+    length: int,
+    filename: str,
+    content_type: str,
+    user_id: Optional[str] = None,
+    language: Optional[str] = None,
+) -> Dict:
+    if length <= 0:
+        raise UploadError("Upload-Length must be a positive integer")
+    if length > MAX_UPLOAD_BYTES:
+        raise UploadError(f"Upload exceeds maximum size of {MAX_UPLOAD_BYTES} bytes", 413)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    _maybe_sweep()
+    upload_id = uuid.uuid4().hex
+    open(_data_path(upload_id), "wb").close()
+    state = {
+        "id": upload_id,
+        "length": length,
+        "offset": 0,
+        "filename": filename,
+        "content_type": content_type,
+        "user_id": user_id,
+        "language": language,
+        "status": "uploading",
+        "sha256": None,
+        "transcript": None,
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    with _state_lock:
+        _write_state(state)
+    _hashers[upload_id] = (hashlib.sha256(), 0)
+    return state
+
+
+def _hasher_at(upload_id: str, offset: int):
+    hasher, hashed = _hashers.get(upload_id, (None, -1))
+    if hasher is None or hashed != offset:
+        # e.g. after a restart: re-hash what is already on disk
+        hasher = hashlib.sha256()
+        with open(_data_path(upload_id), "rb") as f:
+            remaining = offset
+            while remaining > 0:
+                block = f.read(min(CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def append_chunk(upload_id: str, offset: int, stream, checksum: Optional[str] = None) -> Dict:
+    """Append the body of a PATCH request at `offset`.
+
+    `checksum` is an optional tus Upload-Checksum header ("<algorithm> <base64 digest>")
+    covering this chunk; on mismatch the chunk is discarded.
+    """
+    # check before _lock_for so unknown ids never get a lock entry
+    if not valid_upload_id(upload_id) or not load_state(upload_id):
+        raise UploadError("Upload not found", 404)
+    with _lock_for(upload_id):
+        state = load_state(upload_id)
+        if not state:
+            raise UploadError("Upload not found", 404)
+        if state["offset"] >= state["length"]:
+            raise UploadError("Upload already completed", 409)
+        if offset != state["offset"]:
+            raise UploadError(f"Upload-Offset mismatch; expected {state['offset']}", 409)
+
+        chunk_hasher = None
+        if checksum:
+            algorithm, _, expected = checksum.partition(" ")
+            algorithm = algorithm.lower()
+            if algorithm not in CHECKSUM_ALGORITHMS:
+                raise UploadError(
+                    f"Unsupported checksum algorithm {algorithm}; use one of {', '.join(CHECKSUM_ALGORITHMS)}"
+                )
+            chunk_hasher = hashlib.new(algorithm)
+
+        hasher = _hasher_at(upload_id, offset).copy()
+        written = 0
+        limit = state["length"] - offset
+        with open(_data_path(upload_id), "r+b") as f:
+            f.seek(offset)
+            while True:
+                try:
+                    block = stream.read(CHUNK_SIZE)
+                except Exception:
+                    # client went away mid-chunk; keep what arrived so it can resume from there
+                    block = b""
+                if not block:
+                    break
+                if written + len(block) > limit:
+                    f.truncate(offset)
+                    raise UploadError("Chunk exceeds Upload-Length", 413)
+                f.write(block)
+                hasher.update(block)
+                if chunk_hasher:
+                    chunk_hasher.update(block)
+                written += len(block)
+
+            if chunk_hasher and base64.b64encode(chunk_hasher.digest()).decode("ascii") != expected.strip():
+                f.truncate(offset)
+                raise UploadError("Checksum mismatch", 460)
+
+        new_offset = offset + written
+        _hashers[upload_id] = (hasher, new_offset)
+        fields = {"offset": new_offset}
+        if new_offset == state["length"]:
+            fields["sha256"] = hasher.hexdigest()
+            _hashers.pop(upload_id, None)
+        return update_state(upload_id, **fields)
+
+
+def open_upload(upload_id: str):
+    return open(_data_path(upload_id), "rb")
+
+
+def upload_path(upload_id: str) -> str:
+    return _data_path(upload_id)
+
+
+def wait_for_offset(upload_id: str, wanted: int, idle_timeout: float = 60.0) -> bool:
+    """Block until at least `wanted` bytes of the upload are on disk.
+
+    Returns False if no new bytes arrive for `idle_timeout` seconds.
+    """
+    last_offset = -1
+    last_progress = time.monotonic()
+    while True:
+        offset = (load_state(upload_id) or {}).get("offset", 0)
+        if offset >= wanted:
+            return True
+        if offset != last_offset:
+            last_offset = offset
+            last_progress = time.monotonic()
+        elif time.monotonic() - last_progress > idle_timeout:
+            return False
+        time.sleep(0.2)
+
+
+def iter_received(upload_id: str, idle_timeout: float = 60.0) -> Iterator[bytes]:
+    """Yield upload bytes as they land on disk, until the whole upload has been read.
+
+    Lets transcription start while later chunks are still being uploaded.
+    Gives up if no new bytes arrive for `idle_timeout` seconds.
+    """
+    sent = 0
+    last_progress = time.monotonic()
+    with open_upload(upload_id) as f:
+        while True:
+            state = load_state(upload_id) or {}
+            available = state.get("offset", 0)
+            while sent < available:
+                block = f.read(min(CHUNK_SIZE, available - sent))
+                if not block:
+                    break
+                sent += len(block)
+                last_progress = time.monotonic()
+                yield block
+            if sent >= state.get("length", 0):
+                return
+            if time.monotonic() - last_progress > idle_timeout:
+                raise UploadError("Upload stalled while streaming to transcription", 408)
+            time.sleep(0.2)